@@ -612,7 +612,7 @@ elif page == "Audit Logs":
         filters = {
             'limit': limit,
             'start_time': start_date.isoformat() + 'T00:00:00Z',
-            'end_time': end_date.isoformat() + 'T23:59:59Z'
+            'end_time': end_date.isoformat() + 'T23:59:59.999Z'
         }
         
         if tenant_id:
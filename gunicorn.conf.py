@@ -0,0 +1,27 @@
+"""
+Gunicorn configuration for the Flask services (compliance API, mock LLM server).
+
+Usage:
+    gunicorn -c gunicorn.conf.py -b 0.0.0.0:5000 compliance_api:app
+    gunicorn -c gunicorn.conf.py -b 0.0.0.0:8000 mock_llm_server:app
+
+Threaded workers suit these I/O-bound services (SQLite queries, streamed
+CSV exports). Each worker process keeps its own in-process caches.
+"""
+
+import multiprocessing
+import os
+
+# Make src/ importable when launched from the repository root
+pythonpath = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src')
+
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count()))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+keepalive = 30
+
+# Long CSV exports stream for a while; don't kill the worker mid-download
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+
+accesslog = '-'
+errorlog = '-'
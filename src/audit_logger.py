@@ -11,12 +11,30 @@ import logging
 import os
 import re
 import sqlite3
-from datetime import datetime
-from typing import Dict, Optional, List
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Hashable, Iterator, Optional, List, Tuple, Union
 from pathlib import Path
 
 logger = logging.getLogger(__name__)
 
+# Fixed point-lookup statements (served directly by the request_id / input_hash indexes)
+_REQUEST_ID_LOOKUP_SQL = 'SELECT * FROM audit_logs WHERE request_id = ?'
+_INPUT_HASH_LOOKUP_SQL = '''
+    SELECT * FROM audit_logs
+    WHERE input_hash = ?
+    ORDER BY timestamp_ms DESC, request_id DESC
+    LIMIT ?
+'''
+
+# Rows per database round trip when iterating large result sets (exports)
+EXPORT_BATCH_SIZE = 500
+
+# Seconds to wait for another process's schema setup/migration to finish
+SCHEMA_LOCK_TIMEOUT = 300
+
 # Try to import encryption libraries (optional)
 try:
     from cryptography.fernet import Fernet
@@ -29,6 +47,78 @@ except ImportError:
     logger.warning("Encryption not available. Install with: pip install cryptography")
 
 
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def to_epoch_ms(value: Union[str, datetime, int]) -> int:
+    """
+    Convert a timestamp to integer milliseconds since the Unix epoch.
+    
+    Args:
+        value: ISO 8601 string (e.g. 2025-01-15T00:00:00Z), datetime, or
+            epoch milliseconds. Naive values are treated as UTC.
+            
+    Returns:
+        Milliseconds since epoch (UTC)
+        
+    Raises:
+        ValueError: If value is not a valid timestamp
+    """
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, datetime):
+        dt = value
+    elif isinstance(value, str):
+        dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    else:
+        raise ValueError(f"Invalid timestamp: {value!r}")
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return (dt - _EPOCH) // timedelta(milliseconds=1)
+
+
+class _TTLCache:
+    """
+    Thread-safe, size-bounded LRU cache whose entries expire after ttl seconds.
+    
+    A ttl of 0 (or less) disables caching.
+    """
+    
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value, or None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if time.monotonic() >= expires:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+    
+    def set(self, key: Hashable, value: Any):
+        """Cache a value, evicting the least recently used entry if full."""
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        """Discard all cached entries."""
+        with self._lock:
+            self._entries.clear()
+
+
 class AuditLogger:
     """
     Handles audit logging for LLM inference requests with privacy-by-design.
@@ -44,7 +134,9 @@ class AuditLogger:
                  mask_sensitive_fields: bool = True,
                  anonymize_user_ids: bool = False,
                  encrypt_db: bool = False,
-                 encryption_key: Optional[str] = None):
+                 encryption_key: Optional[str] = None,
+                 stats_cache_ttl: Optional[float] = None,
+                 duplicates_cache_ttl: Optional[float] = None):
         """
         Initialize audit logger with privacy features.
         
@@ -54,6 +146,10 @@ class AuditLogger:
             anonymize_user_ids: Hash user IDs for anonymization
             encrypt_db: Enable encryption for audit database
             encryption_key: Encryption key (if None, uses ENCRYPT_AUDIT_DB_KEY env var)
+            stats_cache_ttl: Seconds to cache get_statistics() results
+                (if None, uses AUDIT_STATS_CACHE_TTL env var, default: 30; 0 disables)
+            duplicates_cache_ttl: Seconds to cache get_by_input_hash() results
+                (if None, uses AUDIT_DUPLICATES_CACHE_TTL env var, default: 60; 0 disables)
         """
         if db_path is None:
             db_path = os.getenv('AUDIT_DB_PATH', 'audit_logs.db')
@@ -76,6 +172,18 @@ class AuditLogger:
                 logger.warning(f"Generated key: {key.decode()}. Set ENCRYPT_AUDIT_DB_KEY env var.")
                 self._init_encryption(key.decode())
         
+        # Short-lived cache for aggregate statistics (polled by dashboards)
+        if stats_cache_ttl is None:
+            stats_cache_ttl = float(os.getenv('AUDIT_STATS_CACHE_TTL', '30'))
+        self.stats_cache_ttl = stats_cache_ttl
+        self._stats_cache = _TTLCache(maxsize=1, ttl=stats_cache_ttl)
+        
+        # Per-hash cache for duplicate lookups (compliance re-checks of the same input)
+        if duplicates_cache_ttl is None:
+            duplicates_cache_ttl = float(os.getenv('AUDIT_DUPLICATES_CACHE_TTL', '60'))
+        self.duplicates_cache_ttl = duplicates_cache_ttl
+        self._duplicates_cache = _TTLCache(maxsize=4096, ttl=duplicates_cache_ttl)
+        
         self._init_database()
     
     def _init_encryption(self, key: str):
@@ -138,9 +246,18 @@ class AuditLogger:
         
     def _init_database(self):
         """Initialize audit logs database schema."""
-        conn = sqlite3.connect(self.db_path)
+        # Every gunicorn worker runs this at import; the long timeout lets the
+        # others wait while one migrates (backfill, index builds on large tables)
+        conn = sqlite3.connect(self.db_path, timeout=SCHEMA_LOCK_TIMEOUT)
         cursor = conn.cursor()
         
+        # WAL lets log_request() keep writing while long exports are reading
+        cursor.execute('PRAGMA journal_mode=WAL')
+        
+        # Hold the write lock for the whole check-then-migrate sequence, so
+        # concurrent starts see either the old schema or the finished migration
+        cursor.execute('BEGIN IMMEDIATE')
+        
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS audit_logs (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -160,21 +277,63 @@ class AuditLogger:
                 source TEXT,
                 status TEXT NOT NULL,
                 error_message TEXT,
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                timestamp_ms INTEGER
             )
         ''')
         
+        # Migrate older databases: add numeric timestamp column and backfill it
+        columns = {row[1] for row in cursor.execute('PRAGMA table_info(audit_logs)')}
+        if 'timestamp_ms' not in columns:
+            cursor.execute('ALTER TABLE audit_logs ADD COLUMN timestamp_ms INTEGER')
+        self._backfill_timestamp_ms(cursor)
+        
         # Create indexes for common queries
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_request_id ON audit_logs(request_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_timestamp ON audit_logs(timestamp)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_input_hash ON audit_logs(input_hash)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_tenant_id ON audit_logs(tenant_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_status ON audit_logs(status)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_source ON audit_logs(source)')
-        
+
+        # Composite indexes matching compliance filter + ORDER BY timestamp_ms DESC, request_id DESC
+        # (request_id is the keyset pagination tiebreaker)
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_timestamp_ms_request_id ON audit_logs(timestamp_ms DESC, request_id DESC)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_input_hash_timestamp_ms ON audit_logs(input_hash, timestamp_ms DESC, request_id DESC)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_tenant_timestamp_ms ON audit_logs(tenant_id, timestamp_ms DESC, request_id DESC)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_tenant_status_timestamp_ms ON audit_logs(tenant_id, status, timestamp_ms DESC, request_id DESC)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_tenant_source_timestamp_ms ON audit_logs(tenant_id, source, timestamp_ms DESC, request_id DESC)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_timestamp_ms ON audit_logs(user_id, timestamp_ms DESC, request_id DESC)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_status_timestamp_ms ON audit_logs(status, timestamp_ms DESC, request_id DESC)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_source_timestamp_ms ON audit_logs(source, timestamp_ms DESC, request_id DESC)')
+
+        # Superseded by the timestamp_ms indexes above
+        for index_name in ('idx_timestamp', 'idx_tenant_id', 'idx_input_hash', 'idx_status', 'idx_source',
+                           'idx_timestamp_request_id',
+                           'idx_tenant_timestamp', 'idx_tenant_status_timestamp',
+                           'idx_tenant_source_timestamp', 'idx_user_timestamp'):
+            cursor.execute(f'DROP INDEX IF EXISTS {index_name}')
+
         conn.commit()
         conn.close()
         logger.info(f"Initialized audit database at {self.db_path}")
+    
+    def _backfill_timestamp_ms(self, cursor: sqlite3.Cursor):
+        """Populate timestamp_ms for rows written before the column existed."""
+        rows = cursor.execute('SELECT id, timestamp, created_at FROM audit_logs WHERE timestamp_ms IS NULL').fetchall()
+        if not rows:
+            return
+        
+        updates = []
+        for row_id, timestamp, created_at in rows:
+            try:
+                timestamp_ms = to_epoch_ms(timestamp)
+            except ValueError:
+                # Fall back to the insert time (CURRENT_TIMESTAMP is UTC), else the epoch,
+                # so the row is ordered and pageable and not rescanned on every start
+                try:
+                    timestamp_ms = to_epoch_ms(created_at)
+                except ValueError:
+                    timestamp_ms = 0
+                logger.warning(f"Unparseable audit timestamp {timestamp!r} (row {row_id}); using timestamp_ms={timestamp_ms}")
+            updates.append((timestamp_ms, row_id))
+        cursor.executemany('UPDATE audit_logs SET timestamp_ms = ? WHERE id = ?', updates)
+        logger.info(f"Backfilled timestamp_ms for {len(updates)} audit log entries")
         
     def log_request(self, input_text: str, model_response: Optional[Dict], 
                    metadata: Dict) -> str:
@@ -194,6 +353,13 @@ class AuditLogger:
         request_id = metadata.get('request_id', str(uuid.uuid4()))
         timestamp = metadata.get('timestamp', datetime.utcnow().isoformat() + 'Z')
         
+        # Numeric copy of the timestamp for range filters and ordering
+        try:
+            timestamp_ms = to_epoch_ms(timestamp)
+        except ValueError:
+            logger.warning(f"Invalid timestamp {timestamp!r} for {request_id}; using ingestion time")
+            timestamp_ms = to_epoch_ms(datetime.now(timezone.utc))
+        
         # Calculate input hash for deduplication
         input_hash = hashlib.sha256(input_text.encode('utf-8')).hexdigest()
         
@@ -263,16 +429,19 @@ class AuditLogger:
                     request_id, timestamp, input_hash, input_text,
                     model_version, model_parameters, output_text,
                     confidence_scores, explanation, processing_time_ms,
-                    tokens_used, tenant_id, user_id, source, status, error_message
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    tokens_used, tenant_id, user_id, source, status, error_message,
+                    timestamp_ms
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             ''', (
                 request_id, timestamp, input_hash, input_text,
                 model_version, model_parameters, output_text,
                 confidence_scores, explanation, processing_time_ms,
-                tokens_used, tenant_id, user_id, source, status, error_message
+                tokens_used, tenant_id, user_id, source, status, error_message,
+                timestamp_ms
             ))
             
             conn.commit()
+            self._duplicates_cache.clear()
             logger.debug(f"Logged audit entry: {request_id}")
             
         except sqlite3.Error as e:
@@ -283,31 +452,8 @@ class AuditLogger:
         
         return request_id
     
-    def query_logs(self, filters: Dict) -> List[Dict]:
-        """
-        Query audit logs with filters.
-        
-        Args:
-            filters: Dictionary with filter criteria:
-                - request_id: Exact request ID
-                - input_hash: Input hash to find duplicates
-                - tenant_id: Filter by tenant
-                - user_id: Filter by user
-                - source: Filter by source
-                - status: Filter by status (success/error)
-                - start_time: Start timestamp (ISO format)
-                - end_time: End timestamp (ISO format)
-                - min_confidence: Minimum confidence score
-                - limit: Maximum results (default: 100)
-                
-        Returns:
-            List of audit log entries
-        """
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        # Build query
+    def _build_where_clause(self, filters: Dict) -> Tuple[str, List]:
+        """Build a parameterized WHERE clause from query filters."""
         conditions = []
         params = []
         
@@ -336,63 +482,204 @@ class AuditLogger:
             params.append(filters['status'])
         
         if 'start_time' in filters:
-            conditions.append('timestamp >= ?')
-            params.append(filters['start_time'])
+            conditions.append('timestamp_ms >= ?')
+            params.append(to_epoch_ms(filters['start_time']))
         
         if 'end_time' in filters:
-            conditions.append('timestamp <= ?')
-            params.append(filters['end_time'])
+            conditions.append('timestamp_ms <= ?')
+            params.append(to_epoch_ms(filters['end_time']))
+        
+        # Keyset pagination: resume after the last (timestamp, request_id) seen
+        if 'after_timestamp' in filters and 'after_request_id' in filters:
+            conditions.append('(timestamp_ms, request_id) < (?, ?)')
+            params.extend([to_epoch_ms(filters['after_timestamp']), filters['after_request_id']])
         
         where_clause = ' AND '.join(conditions) if conditions else '1=1'
-        limit = filters.get('limit', 100)
-        
-        query = f'''
-            SELECT * FROM audit_logs
-            WHERE {where_clause}
-            ORDER BY timestamp DESC
-            LIMIT ?
-        '''
-        params.append(limit)
-        
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
-        
-        # Convert to list of dicts
-        results = []
-        for row in rows:
-            result = dict(row)
-            # Parse JSON fields
-            if result.get('model_parameters'):
-                try:
-                    result['model_parameters'] = json.loads(result['model_parameters'])
-                except:
-                    pass
-            if result.get('confidence_scores'):
-                try:
-                    result['confidence_scores'] = json.loads(result['confidence_scores'])
-                except:
-                    pass
-            if result.get('explanation'):
-                try:
-                    result['explanation'] = json.loads(result['explanation'])
-                except:
-                    pass
-            results.append(result)
+        return where_clause, params
+    
+    def _row_to_dict(self, row: sqlite3.Row) -> Dict:
+        """Convert a database row to an audit log entry (parse JSON, decrypt)."""
+        result = dict(row)
+        # Parse JSON fields
+        if result.get('model_parameters'):
+            try:
+                result['model_parameters'] = json.loads(result['model_parameters'])
+            except:
+                pass
+        if result.get('confidence_scores'):
+            try:
+                result['confidence_scores'] = json.loads(result['confidence_scores'])
+            except:
+                pass
+        if result.get('explanation'):
+            try:
+                result['explanation'] = json.loads(result['explanation'])
+            except:
+                pass
+        
+        # Decrypt result if encryption enabled
+        if self.encrypt_db and self.cipher:
+            try:
+                if result.get('input_text'):
+                    result['input_text'] = self.cipher.decrypt(result['input_text'].encode()).decode()
+                if result.get('output_text'):
+                    result['output_text'] = self.cipher.decrypt(result['output_text'].encode()).decode()
+            except Exception as e:
+                logger.warning(f"Error decrypting audit log entry: {e}")
+        
+        return result
+    
+    def iter_logs(self, filters: Dict, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[Dict]:
+        """
+        Iterate over audit logs matching filters without materializing them.
         
-        conn.close()
+        Rows are read in keyset-paged batches of batch_size, and the database
+        connection is closed between batches, so memory use stays bounded and
+        a slow consumer never holds a read transaction open. Accepts the same
+        filters as query_logs(); unlike query_logs(), no limit is applied
+        unless 'limit' is present in filters.
         
-        # Decrypt results if encryption enabled
-        if self.encrypt_db and self.cipher:
-            for result in results:
-                try:
-                    if result.get('input_text'):
-                        result['input_text'] = self.cipher.decrypt(result['input_text'].encode()).decode()
-                    if result.get('output_text'):
-                        result['output_text'] = self.cipher.decrypt(result['output_text'].encode()).decode()
-                except Exception as e:
-                    logger.warning(f"Error decrypting audit log entry: {e}")
-        
-        return results
+        Args:
+            filters: Dictionary with filter criteria (see query_logs)
+            batch_size: Rows fetched per database round trip
+            
+        Yields:
+            Audit log entries, newest first
+        """
+        filters = dict(filters)
+        remaining = filters.pop('limit', None)
+        
+        while remaining is None or remaining > 0:
+            page_size = batch_size if remaining is None else min(batch_size, remaining)
+            where_clause, params = self._build_where_clause(filters)
+            
+            conn = sqlite3.connect(self.db_path)
+            conn.row_factory = sqlite3.Row
+            try:
+                rows = conn.execute(f'''
+                    SELECT * FROM audit_logs
+                    WHERE {where_clause}
+                    ORDER BY timestamp_ms DESC, request_id DESC
+                    LIMIT ?
+                ''', params + [page_size]).fetchall()
+            finally:
+                conn.close()
+            
+            for row in rows:
+                yield self._row_to_dict(row)
+            
+            if len(rows) < page_size:
+                return
+            if remaining is not None:
+                remaining -= len(rows)
+            
+            # Resume the next batch after the last row seen
+            filters['after_timestamp'] = rows[-1]['timestamp_ms']
+            filters['after_request_id'] = rows[-1]['request_id']
+    
+    def query_logs(self, filters: Dict) -> List[Dict]:
+        """
+        Query audit logs with filters.
+        
+        Args:
+            filters: Dictionary with filter criteria:
+                - request_id: Exact request ID
+                - input_hash: Input hash to find duplicates
+                - tenant_id: Filter by tenant
+                - user_id: Filter by user
+                - source: Filter by source
+                - status: Filter by status (success/error)
+                - start_time: Start timestamp (ISO format, datetime or epoch ms)
+                - end_time: End timestamp (ISO format, datetime or epoch ms)
+                - after_timestamp, after_request_id: Keyset cursor; return only
+                  entries that sort after this (timestamp, request_id) pair
+                - min_confidence: Minimum confidence score
+                - limit: Maximum results (default: 100)
+                
+        Returns:
+            List of audit log entries
+        """
+        filters = dict(filters)
+        filters.setdefault('limit', 100)
+        return list(self.iter_logs(filters))
+    
+    def count_logs(self, filters: Dict) -> int:
+        """
+        Count audit logs matching filters with a single COUNT(*) query.
+        
+        Accepts the same filters as query_logs(); limit and the keyset
+        cursor (after_timestamp/after_request_id) are ignored, so the result
+        is the total number of matches across all pages.
+        
+        Args:
+            filters: Dictionary with filter criteria (see query_logs)
+            
+        Returns:
+            Number of matching audit log entries
+        """
+        filters = {k: v for k, v in filters.items() if k not in ('after_timestamp', 'after_request_id')}
+        where_clause, params = self._build_where_clause(filters)
+        
+        conn = sqlite3.connect(self.db_path)
+        try:
+            return conn.execute(f'SELECT COUNT(*) FROM audit_logs WHERE {where_clause}', params).fetchone()[0]
+        finally:
+            conn.close()
+    
+    def get_by_request_id(self, request_id: str) -> Optional[Dict]:
+        """
+        Get a single audit log entry by request ID.
+        
+        Args:
+            request_id: Request ID to look up
+            
+        Returns:
+            Audit log entry, or None if not found
+        """
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            row = conn.execute(_REQUEST_ID_LOOKUP_SQL, (request_id,)).fetchone()
+        finally:
+            conn.close()
+        
+        return self._row_to_dict(row) if row else None
+    
+    def get_by_input_hash(self, input_hash: str, limit: int = 100) -> List[Dict]:
+        """
+        Get all audit log entries for an input hash (duplicate detection).
+        
+        Results are cached per hash for duplicates_cache_ttl seconds. Writes
+        through this logger clear the cache; entries written by other
+        processes become visible once the TTL expires. Results containing a
+        user_id are never cached, so a GDPR deletion handled by another
+        worker process takes effect immediately.
+        
+        Args:
+            input_hash: SHA256 hash of input text
+            limit: Maximum results (default: 100)
+            
+        Returns:
+            List of audit log entries, newest first
+        """
+        cache_key = (input_hash, limit)
+        results = self._duplicates_cache.get(cache_key)
+        if results is not None:
+            return list(results)
+        
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            rows = conn.execute(_INPUT_HASH_LOOKUP_SQL, (input_hash, limit)).fetchall()
+        finally:
+            conn.close()
+        
+        results = [self._row_to_dict(row) for row in rows]
+        # Other workers can't clear this cache after delete_user_data(); only
+        # cache results with no per-user data that an erasure could remove
+        if not any(result.get('user_id') for result in results):
+            self._duplicates_cache.set(cache_key, results)
+        return list(results)
     
     def delete_user_data(self, user_id: str, tenant_id: Optional[str] = None) -> int:
         """
@@ -420,11 +707,33 @@ class AuditLogger:
         conn.commit()
         conn.close()
         
+        if deleted_count:
+            self.invalidate_statistics_cache()
+            self._duplicates_cache.clear()
+        
         logger.info(f"Deleted {deleted_count} audit log entries for user {user_id}")
         return deleted_count
     
+    def invalidate_statistics_cache(self):
+        """Discard cached statistics so the next call recomputes them."""
+        self._stats_cache.clear()
+    
     def get_statistics(self) -> Dict:
-        """Get audit log statistics."""
+        """
+        Get audit log statistics.
+        
+        Results are cached in-process for stats_cache_ttl seconds, since the
+        aggregates require full-table scans and change slowly.
+        """
+        stats = self._stats_cache.get('statistics')
+        if stats is None:
+            stats = self._compute_statistics()
+            self._stats_cache.set('statistics', stats)
+        
+        return dict(stats)
+    
+    def _compute_statistics(self) -> Dict:
+        """Compute audit log statistics from the database."""
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
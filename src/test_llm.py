@@ -6,6 +6,9 @@ import requests
 import json
 import time
 
+# Shared session so repeated calls reuse a keep-alive connection
+_SESSION = requests.Session()
+
 def test_llm_completion(prompt: str, model: str = "mistralai/Mistral-7B-Instruct-v0.2"):
     """
     Test LLM completion endpoint
@@ -24,7 +27,7 @@ def test_llm_completion(prompt: str, model: str = "mistralai/Mistral-7B-Instruct
     
     start_time = time.time()
     try:
-        response = requests.post(url, json=payload, timeout=30)
+        response = _SESSION.post(url, json=payload, timeout=30)
         elapsed_time = time.time() - start_time
         
         if response.status_code == 200:
@@ -50,7 +53,7 @@ def test_health():
     Test if server is healthy
     """
     try:
-        response = requests.get("http://localhost:8000/health", timeout=5)
+        response = _SESSION.get("http://localhost:8000/health", timeout=5)
         if response.status_code == 200:
             print("[OK] Server is healthy")
             return True